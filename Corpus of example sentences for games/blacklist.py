@@ -0,0 +1,127 @@
+"""
+Finds unsuitable words (black list) in lemmas, their compound parts and word forms
+All words of the list are in one Aho-Corasick automaton, so a sentence is
+checked in one pass over its lemmas and forms, however long the list is.
+
+EDT lemmas mark compound parts with _ and derivational suffixes with =
+(eg tule_kahju, arg_püks=likkus). A word of the list is found if it is the
+whole lemma without these marks or a compound part (or several parts
+together): it begins at the beginning of the lemma or after _ and ends at
+the end of the lemma, before _ or before =. A derivational suffix alone
+(eg =mata) is never a match. Word forms are compared as whole words.
+
+Short words of the list are often innocent parts of compounds (riist in
+sõidu_riist, tutt in tutt_makaak, homo in homo_seksuaal), so a word shorter
+than min_part letters is found only as a whole lemma or a whole form.
+Compounds that end with a short unsuitable word are then not found.
+"""
+# from blacklist import Blacklist
+# blacklist = Blacklist.from_file("inappropriate_words.txt")
+# blacklist.find(lemmas=["tule_kahju"], forms=["Tulekahju"])
+
+import re
+from collections import deque
+
+SEPARATOR = "\n" # between words, cannot be a part of a word of the list
+MIN_PART = 6 # shortest word of the list that is found as a part of a lemma
+
+
+class Blacklist:
+    """Aho-Corasick automaton of the unsuitable words."""
+    def __init__(self, words, min_part=MIN_PART):
+        self.min_part = min_part
+        self.goto = [{}] # state -> {character: state}
+        self.fail = [0]
+        self.output = [None] # word of the list that ends in the state
+        self.words = set()
+        for word in words:
+            word = word.strip().lower()
+            if word and not word.isdigit() and SEPARATOR not in word:
+                self.add(word)
+        self.build()
+
+    @classmethod
+    def from_file(cls, filename, min_part=MIN_PART):
+        """
+        Reads the list of unsuitable words (word and its frequency on every line)
+        :param filename:
+        :param min_part: shortest word that is found as a part of a lemma
+        :return:
+        """
+        with open(filename, "r", encoding="utf8") as f:
+            words = f.read()
+        return cls(re.sub(r"\s+", "\n", words).split("\n"), min_part)
+
+    def add(self, word):
+        self.words.add(word)
+        state = 0
+        for char in word:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state] = word
+
+    def build(self):
+        """Computes failure links breadth first, every state also gets the matches of its failure state."""
+        self.matches = [[word] if word is not None else [] for word in self.output]
+        queue = deque(self.goto[0].values()) # failure links of depth 1 go to the root
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.matches[child] = self.matches[child] + self.matches[self.fail[child]]
+
+    def find(self, lemmas=(), forms=()):
+        """
+        Returns the first unsuitable word found in the sentence or None
+        :param lemmas: lemmas with compound marks
+        :param forms: word forms
+        :return:
+        """
+        chars = []
+        starts = set() # positions where a word of the list can begin
+        ends = set() # positions where a word of the list can end
+        whole = set() # (begin, end) of whole lemmas and forms, short words are found only there
+        for lemma in lemmas:
+            begin = len(chars)
+            starts.add(begin)
+            for char in lemma.lower():
+                if char == "_":
+                    starts.add(len(chars))
+                    ends.add(len(chars))
+                elif char == "=":
+                    ends.add(len(chars))
+                else:
+                    chars.append(char)
+            ends.add(len(chars))
+            whole.add((begin, len(chars)))
+            chars.append(SEPARATOR)
+        for form in forms:
+            begin = len(chars)
+            chars.extend(form.lower())
+            ends.add(len(chars))
+            whole.add((begin, len(chars)))
+            chars.append(SEPARATOR)
+        goto, fail, matches, min_part = self.goto, self.fail, self.matches, self.min_part
+        state = 0
+        for position, char in enumerate(chars):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if matches[state] and position + 1 in ends:
+                end = position + 1
+                for word in matches[state]:
+                    begin = end - len(word)
+                    if (begin, end) in whole or (len(word) >= min_part and begin in starts and end in ends):
+                        return word
+        return None
+
+    def __contains__(self, word):
+        return word.lower() in self.words
@@ -0,0 +1,177 @@
+"""
+Reading and writing of plain and compressed corpus files
+Compression is chosen by the extension of the filename (.gz, .xz, .zst).
+Compressing and decompressing run in a separate thread, so they overlap
+with parsing the sentences in the main thread.
+"""
+# from corpus_io import open_corpus
+# with open_corpus("level_1.conllu.gz", "w") as f: ...
+
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError: # zstandard is needed only for .zst files
+    zstandard = None
+
+CHUNK = 1 << 16
+QUEUE_SIZE = 16 # chunks waiting between the thread and the caller
+EXTENSIONS = {'.gz': 'gz', '.xz': 'xz', '.zst': 'zst'}
+_DONE = object()
+
+
+def compression(filename):
+    """
+    Returns the compression of a file (gz, xz, zst) or None for plain files
+    :param filename:
+    :return:
+    """
+    for extension, name in EXTENSIONS.items():
+        if filename.endswith(extension):
+            return name
+    return None
+
+
+def strip_extension(filename):
+    """
+    Returns the filename without the extension of compression
+    :param filename:
+    :return:
+    """
+    name = compression(filename)
+    if name is None:
+        return filename
+    return filename[:-len(name) - 1]
+
+
+def _open_binary(filename, mode):
+    name = compression(filename)
+    if name == 'gz':
+        return gzip.open(filename, mode)
+    if name == 'xz':
+        return lzma.open(filename, mode)
+    if zstandard is None:
+        raise ImportError("package zstandard is needed for reading and writing .zst files")
+    f = open(filename, mode)
+    if 'r' in mode:
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True, read_across_frames=True)
+    return zstandard.ZstdCompressor().stream_writer(f, closefd=True)
+
+
+class _ThreadedReader(io.RawIOBase):
+    """Decompresses a file in a separate thread, the caller gets the bytes from a bounded queue."""
+    def __init__(self, filename):
+        self.source = _open_binary(filename, 'rb')
+        self.chunks = queue.Queue(QUEUE_SIZE)
+        self.buffer = b''
+        self.error = None
+        self.finished = False
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stop.is_set():
+                chunk = self.source.read(CHUNK)
+                if not chunk:
+                    break
+                self.chunks.put(chunk)
+        except Exception as error: # raised again in the caller's thread
+            self.error = error
+        finally:
+            self.chunks.put(_DONE)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer and not self.finished:
+            chunk = self.chunks.get()
+            if chunk is _DONE:
+                self.finished = True
+                if self.error is not None:
+                    raise self.error
+            else:
+                self.buffer = chunk
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stop.set()
+            while self.thread.is_alive(): # let the thread see the stop flag
+                try:
+                    self.chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.source.close()
+        super().close()
+
+
+class _ThreadedWriter(io.RawIOBase):
+    """Compresses and writes a file in a separate thread, the caller puts the bytes into a bounded queue."""
+    def __init__(self, filename):
+        self.target = _open_binary(filename, 'wb')
+        self.chunks = queue.Queue(QUEUE_SIZE)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is _DONE:
+                break
+            if self.error is None:
+                try:
+                    self.target.write(chunk)
+                except Exception as error: # raised again in the caller's thread
+                    self.error = error
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.error is not None:
+            raise self.error
+        self.chunks.put(bytes(b))
+        return len(b)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.chunks.put(_DONE)
+            self.thread.join()
+            self.target.close()
+        finally:
+            super().close()
+        if self.error is not None:
+            raise self.error
+
+
+def open_corpus(filename, mode='r', encoding='utf8', newline=None):
+    """
+    Opens a plain or compressed corpus file as a text file
+    :param filename: compression is chosen by the extension (.gz, .xz, .zst)
+    :param mode: 'r' or 'w'
+    :param encoding:
+    :param newline:
+    :return: file object
+    """
+    if compression(filename) is None:
+        return open(filename, mode, encoding=encoding, newline=newline)
+    if mode.startswith('r'):
+        binary = io.BufferedReader(_ThreadedReader(filename), CHUNK)
+    elif mode.startswith('w'):
+        binary = io.BufferedWriter(_ThreadedWriter(filename), CHUNK)
+    else:
+        raise ValueError("mode must be 'r' or 'w'")
+    return io.TextIOWrapper(binary, encoding=encoding, newline=newline)
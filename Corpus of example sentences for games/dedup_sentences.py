@@ -0,0 +1,248 @@
+"""
+Finds near-duplicate sentences across level files and other corpora
+Sentences are compared by MinHash signatures of their text and lemma
+shingles, candidate pairs are found with locality-sensitive hashing (LSH),
+so the whole run is a single pass with no pairwise comparison of sentences.
+"""
+# python dedup_sentences.py folder_or_file [folder_or_file ...] [--drop OUTPUT_FOLDER]
+
+import argparse
+import csv
+import os
+import re
+import sys
+from array import array
+from collections import defaultdict
+from hashlib import shake_128
+from operator import eq
+
+from corpus_io import open_corpus, strip_extension
+
+parser = argparse.ArgumentParser(description='Reports (and optionally drops) near-duplicate sentences in conllu-files and Sketch Engine csv-files.')
+parser.add_argument('paths', type=str, nargs='+',
+                     help="files or folders with conllu-files (level files, treebanks) or Sketch Engine csv-files")
+parser.add_argument('--threshold', dest='threshold', type=float, default=0.8,
+                     help="estimated Jaccard similarity at which two sentences are near-duplicates")
+parser.add_argument('--num-perm', dest='num_perm', type=int, default=64,
+                     help="number of hash functions in a MinHash signature")
+parser.add_argument('--bands', dest='bands', type=int, default=16,
+                     help="number of LSH bands (must divide --num-perm)")
+parser.add_argument('--shingle', dest='shingle', type=int, default=2,
+                     help="length of word n-grams used as shingles")
+parser.add_argument('--seed', dest='seed', type=int, default=1,
+                     help="seed for the MinHash hash functions")
+parser.add_argument('--drop', dest='drop', type=str, default=None,
+                     help="folder where copies of the input files without near-duplicates are written")
+
+WORD = re.compile(r"\w+")
+
+
+def get_files(dir):
+    """
+    Returns all the files in a folder
+    Recursive version
+    :param dir:
+    :return: the list of file names
+    """
+    files = []
+    for file in sorted(os.listdir(dir)):
+        path = dir + '/' + file
+        if os.path.isdir(path):
+            files += get_files(path)
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def read_conllu(file):
+    """
+    Reads a conllu-file sentence by sentence
+    Yields the lines of every sentence, nothing else is kept in memory
+    :param file:
+    :return: lines, text, lemmas of each sentence
+    """
+    with open_corpus(file, "r", encoding="utf8") as f:
+        lines = []
+        for line in f:
+            line = line.rstrip('\n')
+            if line.strip():
+                lines.append(line)
+                continue
+            if lines:
+                yield conllu_sentence(lines)
+                lines = []
+        if lines:
+            yield conllu_sentence(lines)
+
+
+def conllu_sentence(lines):
+    text = ''
+    lemmas = []
+    for line in lines:
+        if line.startswith('# text'):
+            text = line.split('=', 1)[1].strip()
+        elif line[0] != '#':
+            columns = line.split('\t')
+            if len(columns) > 2 and columns[0].isdigit(): # multiword tokens and empty nodes are skipped
+                lemmas.append(columns[2])
+    return lines, text, lemmas
+
+
+def read_csv(file):
+    """
+    Reads a corpus downloaded from Sketch Engine, sentence is in the third column
+    The lines of the header (corpus, subcorpus, size and query) are skipped
+    :param file:
+    :return: row, text and empty lemma list of each sentence
+    """
+    with open_corpus(file, "r", encoding="utf8", newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                yield row, None, []
+                continue
+            yield row, row[2], []
+
+
+def read_sentences(file):
+    if strip_extension(file).endswith('.csv'):
+        return read_csv(file)
+    return read_conllu(file)
+
+
+class MinHashLSH:
+    """MinHash signatures with banded LSH index of the sentences seen so far."""
+    def __init__(self, num_perm=64, bands=16, seed=1):
+        if num_perm % bands != 0:
+            raise ValueError("number of bands must divide number of hash functions")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.salt = ('%d\n' % seed).encode('utf8')
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+        self.signatures = array('I')  # signatures of the kept sentences one after another, in the order of self.keys
+        self.keys = []
+
+    def signature(self, shingles):
+        """
+        Computes the MinHash signature of a set of shingles
+        One extendable-output hash of a shingle gives its values of all the hash functions,
+        the minimum of every function is taken over all shingles at once
+        :param shingles:
+        :return: array of num_perm 32-bit values
+        """
+        size = 4 * self.num_perm
+        hashes = [array('I', shake_128(self.salt + s.encode('utf8')).digest(size)) for s in shingles]
+        return array('I', map(min, *hashes)) if len(hashes) > 1 else hashes[0]
+
+    def band_keys(self, sig):
+        rows = self.rows
+        return [sig[i * rows:(i + 1) * rows].tobytes() for i in range(self.bands)]
+
+    def query(self, sig, threshold):
+        """
+        Returns the key of the most similar indexed sentence at or above threshold
+        :param sig:
+        :param threshold:
+        :return: (key, similarity) or (None, 0.0)
+        """
+        seen = set()
+        best, best_sim = None, 0.0
+        for band, key in zip(self.buckets, self.band_keys(sig)):
+            for candidate in band.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                other = self.signatures[candidate * self.num_perm:(candidate + 1) * self.num_perm]
+                sim = sum(map(eq, sig, other)) / self.num_perm
+                if sim >= threshold and sim > best_sim:
+                    best, best_sim = candidate, sim
+        if best is None:
+            return None, 0.0
+        return self.keys[best], best_sim
+
+    def insert(self, key, sig):
+        index = len(self.keys)
+        self.keys.append(key)
+        self.signatures.extend(sig)
+        for band, band_key in zip(self.buckets, self.band_keys(sig)):
+            band[band_key].append(index)
+
+
+def shingles(text, lemmas, n):
+    """
+    Creates the set of shingles of a sentence: word n-grams of the lowercased
+    text and of the lemma sequence (compound markers _ and = removed)
+    :param text:
+    :param lemmas:
+    :param n:
+    :return:
+    """
+    result = set()
+    words = WORD.findall(text.lower())
+    lemmas = [re.sub("[_=]", "", l.lower()) for l in lemmas if WORD.search(l)]
+    for prefix, seq in (('w', words), ('l', lemmas)):
+        if not seq:
+            continue
+        if len(seq) < n:
+            result.add(prefix + ' ' + ' '.join(seq))
+        for i in range(len(seq) - n + 1):
+            result.add(prefix + ' ' + ' '.join(seq[i:i + n]))
+    return result
+
+
+def sentence_id(lines, file, number):
+    for line in lines:
+        if isinstance(line, str) and line.startswith('# sent_id'):
+            return line.split('=', 1)[1].strip()
+    return '%s:%d' % (file, number)
+
+
+def write_sentence(f_out, file, lines):
+    if strip_extension(file).endswith('.csv'):
+        csv.writer(f_out).writerow(lines)
+    else:
+        f_out.write('\n'.join(lines) + '\n\n')
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    files = []
+    for path in args.paths:
+        files += get_files(path) if os.path.isdir(path) else [path]
+
+    index = MinHashLSH(args.num_perm, args.bands, args.seed)
+    total, duplicates = 0, 0
+    rejected = set() # ids of the near-duplicates, the same sentence in other level files is not reported again
+    for file in files:
+        f_out, written = None, None
+        if args.drop:
+            os.makedirs(args.drop, exist_ok=True)
+            f_out = open_corpus(os.path.join(args.drop, os.path.basename(file)), 'w', encoding='utf8', newline='')
+            written = MinHashLSH(args.num_perm, args.bands, args.seed) # sentences written to this file
+        for number, (lines, text, lemmas) in enumerate(read_sentences(file)):
+            if text is None: # header of the Sketch Engine csv-file
+                if f_out:
+                    write_sentence(f_out, file, lines)
+                continue
+            total += 1
+            key = sentence_id(lines, file, number), file
+            sig = index.signature(shingles(text, lemmas, args.shingle) or {text})
+            new = False
+            if key[0] not in rejected: # near-duplicates found in earlier files are not reported again
+                original, sim = index.query(sig, args.threshold)
+                if original is None:
+                    index.insert(key, sig)
+                    new = True
+                elif original[0] != key[0]: # the same sentence in another level file is not a duplicate
+                    duplicates += 1
+                    rejected.add(key[0])
+                    print('%s\t%s\t%s\t%s\t%.2f' % (key[1], key[0], original[1], original[0], sim))
+            # a sentence is dropped only if a similar sentence is already written to this file,
+            # so a level does not lose a sentence whose original is in other levels only
+            if f_out and (new or written.query(sig, args.threshold)[0] is None):
+                written.insert(key, sig)
+                write_sentence(f_out, file, lines)
+        if f_out:
+            f_out.close()
+    print('%d sentences, %d near-duplicates' % (total, duplicates), file=sys.stderr)
@@ -8,15 +8,21 @@ __author__ = "Pierre Nugues"
 
 import os
 import re
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 import argparse
 import codecs
+from corpus_io import open_corpus
 
 parser = argparse.ArgumentParser(description='Divides sentences into different files based on their level tags.')
 parser.add_argument('folder', type=str,
-                     help="folder with tagged (levels) conllu-files")
+                     help="folder with tagged (levels) conllu-files, also compressed (.gz, .xz, .zst)")
+parser.add_argument('--compress', dest='compress', type=str, default=None, choices=['gz', 'xz', 'zst'],
+                     help="compression of the level files")
+parser.add_argument('--processes', dest='processes', type=int, default=os.cpu_count() or 1,
+                     help="number of files processed at the same time")
 
-args = parser.parse_args()
+column_names_u = ['id', 'form', 'lemma', 'upostag', 'xpostag', 'feats', 'head', 'deprel', 'deps', 'misc']
 
 def get_files(dir):
     """
@@ -27,7 +33,7 @@ def get_files(dir):
     :return: the list of file names
     """
     files = []
-    for file in os.listdir(dir):
+    for file in sorted(os.listdir(dir)): # the same order on every system, the first sentence with an id is kept
         path = dir + '/' + file
         if os.path.isdir(path):
             files += get_files(path)
@@ -38,15 +44,22 @@ def get_files(dir):
 
 def read_sentences(file):
     """
-    Creates a list of sentences from the corpus
+    Reads sentences from the corpus one by one (file can be compressed)
     Each sentence is a string
     :param file:
     :return:
     """
-    with open (file, "r", encoding="utf8") as f:
-        sentences=f.read().strip()
-        sentences = sentences.split('\n\n')
-        return sentences
+    with open_corpus(file, "r", encoding="utf8") as f:
+        lines=[]
+        for line in f:
+            line=line.rstrip('\n')
+            if line.strip():
+                lines.append(line)
+            elif lines:
+                yield '\n'.join(lines)
+                lines=[]
+        if lines:
+            yield '\n'.join(lines)
 
 
 def split_rows(sentences, column_names):
@@ -78,92 +91,131 @@ def split_rows(sentences, column_names):
     return new_sentences, texts
 
 
-def save(formatted_corpus, column_names, sent_id, text, key):
-    for_check=[]
-    for old_sentence,id,sent_text in zip(formatted_corpus,sent_id,text):
-        sentence=[]
-        if id not in for_check:
-            for_check.append(id)
-            f_out.write(id + '\n') # adds sentence id and plain sentence
-            f_out.write(sent_text + '\n')
-            for i in old_sentence:
-                new_sentence = dict((k,v) for k,v in i.items())
-                new_misc=re.sub("Lvl=([^|]*).*",r"\1",new_sentence["misc"])
-                new_misc=new_misc.split(",") # [1,14]
-                if len(new_misc)==1: # other level tags are removed
-                    for number in new_misc:
-                        if key==number:
-                            new_sentence["misc"]="Lvl="+key
-                            sentence.append(new_sentence)
-                        else:
-                            new_sentence["misc"]="_"
-                            sentence.append(new_sentence)
-                if len(new_misc)>1: # if one word has more than one level tag
-                    info=[]
-                    for number in new_misc:
-                        if key==number:
-                            info.append(number)
-                        else:
-                            continue
-                    if len(info)==1:
-                       new_sentence["misc"]="Lvl="+key
-                       sentence.append(new_sentence)
-                    else:
-                        new_sentence["misc"]="_"
-                        sentence.append(new_sentence)
-            for row in sentence[1:]:
-                for col in column_names[:-1]:
-                    if col in row:
-                        f_out.write(row[col] + '\t')
-                    else:
-                        f_out.write('_\t')
-                col = column_names[-1]
-                if col in row:
-                    f_out.write(row[col] + '\n')
+def format_sentence(old_sentence, column_names, id, sent_text, key):
+    """
+    Creates the text of a sentence for the file of level key
+    Other level tags are removed
+    :return: sentence in conllu-format
+    """
+    out=[]
+    sentence=[]
+    out.append(id + '\n') # adds sentence id and plain sentence
+    out.append(sent_text + '\n')
+    for i in old_sentence:
+        new_sentence = dict((k,v) for k,v in i.items())
+        new_misc=re.sub("Lvl=([^|]*).*",r"\1",new_sentence["misc"])
+        new_misc=new_misc.split(",") # [1,14]
+        if len(new_misc)==1: # other level tags are removed
+            for number in new_misc:
+                if key==number:
+                    new_sentence["misc"]="Lvl="+key
+                    sentence.append(new_sentence)
+                else:
+                    new_sentence["misc"]="_"
+                    sentence.append(new_sentence)
+        if len(new_misc)>1: # if one word has more than one level tag
+            info=[]
+            for number in new_misc:
+                if key==number:
+                    info.append(number)
                 else:
-                    f_out.write('_\n')
-            f_out.write('\n')
+                    continue
+            if len(info)==1:
+               new_sentence["misc"]="Lvl="+key
+               sentence.append(new_sentence)
+            else:
+                new_sentence["misc"]="_"
+                sentence.append(new_sentence)
+    for row in sentence[1:]:
+        for col in column_names[:-1]:
+            if col in row:
+                out.append(row[col] + '\t')
+            else:
+                out.append('_\t')
+        col = column_names[-1]
+        if col in row:
+            out.append(row[col] + '\n')
         else:
-            pass
+            out.append('_\n')
+    out.append('\n')
+    return ''.join(out)
+
+
+def divide_file(file):
+    """
+    Divides the sentences of one file into levels
+    Sentences with tags "Not" or "NotTrv" are left out
+    :param file:
+    :return: dictionary level -> list of (sentence id, sentence in conllu-format)
+    """
+    divided_sentences=defaultdict(list)
+    sentences = read_sentences(file)
+    formatted_corpus = split_rows(sentences, column_names_u)
+    for sentence_list, info_list in zip(formatted_corpus[0],formatted_corpus[1]):
+        for_check=[]
+        for sentence_dict in sentence_list:
+            for_check.append(sentence_dict["misc"])
+        if "Lvl=NotTrv" in for_check or "Lvl=Not" in for_check or "Lvl=NotTrv|SpaceAfter=No" in for_check or "Lvl=Not|SpaceAfter=No" in for_check:
+            continue
+        levels=[]
+        for sentence_dict in sentence_list:
+            new_misc=re.sub("Lvl=([^|]*).*",r"\1",sentence_dict["misc"])
+            for number in new_misc.split(","):
+                if number.isdigit() and number not in levels:
+                    levels.append(number)
+        for key in levels:
+            id, text = info_list
+            divided_sentences[key].append((id, format_sentence(sentence_list, column_names_u, id, text, key)))
+    return dict(divided_sentences)
+
+
+def divide_files(executor, files, window):
+    """
+    Divides files in the pool, at most window files are submitted but not yet consumed
+    :param executor:
+    :param files:
+    :param window:
+    :return: results of divide_file in the order of files
+    """
+    pending = deque()
+    files = iter(files)
+    for file in files:
+        pending.append(executor.submit(divide_file, file))
+        if len(pending) >= window:
+            break
+    while pending:
+        divided_sentences = pending.popleft().result()
+        file = next(files, None)
+        if file is not None: # the next file is submitted when the oldest result is taken
+            pending.append(executor.submit(divide_file, file))
+        yield divided_sentences
 
 
 if __name__ == '__main__':
 
-    divided_sentences=defaultdict(list)
-    column_names_u = ['id', 'form', 'lemma', 'upostag', 'xpostag', 'feats', 'head', 'deprel', 'deps', 'misc']
+    args = parser.parse_args()
     files = get_files(args.folder) # folder of all the files with level tags
-    for file in files:
-        sentences = read_sentences(file)
-        formatted_corpus = split_rows(sentences, column_names_u)
-        for sentence_list, info_list in zip(formatted_corpus[0],formatted_corpus[1]):
-            for_check=[]
-            for sentence_dict in sentence_list:
-                for_check.append(sentence_dict["misc"])
-            if "Lvl=NotTrv" in for_check or "Lvl=Not" in for_check or "Lvl=NotTrv|SpaceAfter=No" in for_check or "Lvl=Not|SpaceAfter=No" in for_check:
-                continue
-            for sentence_dict in sentence_list:
-                new_misc=re.sub("Lvl=([^|]*).*",r"\1",sentence_dict["misc"])
-                if "," not in new_misc:
-                    if new_misc.isdigit():
-                        add=sentence_list, info_list
-                        divided_sentences[new_misc].append(add)
-                else:
-                    new_misc=new_misc.split(",")
-                    for number in new_misc:
-                        if number.isdigit():
-                            add=sentence_list, info_list
-                            divided_sentences[number].append(add)
-
-    divided_sentences=dict(divided_sentences)
-    #print(divided_sentences)
-    for key, value in divided_sentences.items(): 
-        sentences=[]
-        id=[]
-        text=[]
-        for item in value:       
-            sentences.append(item[0])
-            id.append(item[1][0])
-            text.append(item[1][1])
-        
-        with open("level_"+key+".conllu", 'w') as f_out:
-            save(sentences,column_names_u, id, text, key)
+    extension = "." + args.compress if args.compress else ""
+    level_files={}
+    for_check=defaultdict(set) # sentence ids already written to each level
+    if args.processes > 1 and len(files) > 1:
+        executor = ProcessPoolExecutor(args.processes)
+        results = divide_files(executor, files, args.processes * 2) # results come in the order of files
+    else:
+        executor = None
+        results = map(divide_file, files)
+    try:
+        for divided_sentences in results:
+            for key, value in divided_sentences.items():
+                if key not in level_files:
+                    level_files[key] = open_corpus("level_"+key+".conllu"+extension, 'w', encoding="utf8")
+                f_out = level_files[key]
+                for id, sentence in value:
+                    if id not in for_check[key]: # the first sentence with the same id is kept
+                        for_check[key].add(id)
+                        f_out.write(sentence)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        for f_out in level_files.values():
+            f_out.close()
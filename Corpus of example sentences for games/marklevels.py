@@ -11,14 +11,9 @@ import estnltk
 from estnltk import synthesize
 
 from udapi.core.block import Block
+from udapi.block.ud.blacklist import Blacklist
 
-unsuitable_words = [] # list of unsuitable words (black list)
-with open("inappropriate_words.txt","r",encoding="utf8") as f:
-    words = f.read()
-    words = re.sub(r"\s+", "\n", words).split("\n")
-    for word in words:
-        if not word.isdigit():
-            unsuitable_words.append(word)
+unsuitable_words = Blacklist.from_file("inappropriate_words.txt") # unsuitable words (black list)
 
 unsuitable_advmods=[] # list of adverbials that won't be asked (such as "ka", "aga" etc)
 with open("unsuitable_adverbials.txt","r",encoding="utf8") as f:
@@ -92,23 +87,10 @@ class MarkLevels(Block):
                 if  upos!= "VERB" and "AUX" not in [n.upos for n in node.children] : 
                     self.log(node,'Not','without verb')
                     return
-                for l in [n.lemma for n in node.root.descendants]:
-                    for i in unsuitable_words:
-                        l=l.lower()
-                        if "=" in l:
-                            l=l.replace("=","")
-                            if l == i:
-                                self.log(node,'Not','includes an unsuitable word')
-                                return
-                        elif "_" in l:
-                            l=l.replace("_","")
-                            if l == i:
-                                self.log(node,'Not','includes an unsuitable word')
-                                return
-                        else:
-                            if l == i:
-                                self.log(node,'Not','includes an unsuitable word')
-                                return
+                words = node.root.descendants # lemmas, their compound parts and word forms (not of names)
+                if unsuitable_words.find([n.lemma for n in words], [n.form for n in words if n.upos != "PROPN"]) is not None:
+                    self.log(node,'Not','includes an unsuitable word')
+                    return
                 if [n.form for n in node.descendants].count("?") < 1 and [n.form for n in node.root.descendants].count(".") < 1 and [n.form for n in node.root.descendants].count("!") < 1: 
                     self.log(node,'Not','not a correct punctuation mark')
                     return
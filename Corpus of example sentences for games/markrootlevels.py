@@ -3,30 +3,120 @@
 Usage:
 udapy -s ud.MarkRootLevels < in.conllu > marked.conllu 2> log.txt
 
+The order of the checks can be calibrated on a sample corpus:
+udapy -s ud.MarkRootLevels calibrate=2000 < sample.conllu > /dev/null 2> log.txt
+and the order printed in the log can be given with check_order=...
 """
 import collections
 import logging
 import re
+import time
 
 from udapi.core.block import Block
+from udapi.block.ud.blacklist import Blacklist
 
-unsuitable_words = [] # list of unsuitable words (black list)
-with open("inappropriate_words.txt","r",encoding="utf8") as f:
-    words = f.read()
-    words = re.sub(r"\s+", "\n", words).split("\n")
-    for word in words:
-        if not word.isdigit():
-            unsuitable_words.append(word)
+unsuitable_words = Blacklist.from_file("inappropriate_words.txt") # unsuitable words (black list)
 
 unsuitable_advmods=[] # list of adverbials that won't be asked (such as "ka", "aga" etc)
 with open("unsuitable_adverbials.txt","r",encoding="utf8") as f:
     adverbials = f.read().splitlines()
     for word in adverbials:
-        unsuitable_advmods.append(word)   
+        unsuitable_advmods.append(word)
+
+capital_letter = re.compile("[A-ZÜÕÄÖ].*") # word starts with a capital letter
+unsuitable_marks = frozenset(["(",")","[","]","{","}",":",";","-","/","\\"]) # some unsuitable marks
+
+
+class RootCounts:
+    """Everything the root checks need, collected in one scan over the sentence."""
+    __slots__ = ('upos', 'descendants', 'punct', 'parataxis', 'orphan', 'aux_child', 'question', 'dot',
+                 'exclamation', 'first', 'marks', 'verbs', 'auxes', 'v_xpos', 'conj', 'lemmas', 'forms')
+
+    def __init__(self, node):
+        self.upos = node.upos
+        self.punct = self.parataxis = self.orphan = 0
+        self.verbs = self.auxes = self.v_xpos = 0
+        self.aux_child = self.question = self.dot = self.exclamation = self.marks = self.conj = False
+        self.lemmas = []
+        self.forms = []
+        self.first = node
+        every = node.root.descendants
+        if node.parent is node.root and len(node.root.children) == 1:
+            subtree = None # all other words are descendants of node
+            self.descendants = len(every) - 1
+        else:
+            subtree = set(id(n) for n in node.descendants)
+            self.descendants = len(subtree)
+        for n in every:
+            form, upos = n.form, n.upos
+            self.lemmas.append(n.lemma)
+            if upos != "PROPN": # names are compared by lemma only (eg the title "Kusi")
+                self.forms.append(form)
+            if n.xpos == "V":
+                self.v_xpos += 1
+            if upos == "CCONJ" or upos == "SCONJ":
+                self.conj = True
+            if form == "." :
+                self.dot = True
+            elif form == "!":
+                self.exclamation = True
+            if n is node or (subtree is not None and id(n) not in subtree):
+                continue
+            # words below are descendants of node
+            deprel = n.deprel
+            if deprel == "punct":
+                self.punct += 1
+            elif deprel == "parataxis":
+                self.parataxis += 1
+            elif deprel == "orphan":
+                self.orphan += 1
+            if upos == "VERB":
+                self.verbs += 1
+            elif upos == "AUX":
+                self.auxes += 1
+                if n.parent is node:
+                    self.aux_child = True
+            if form == "?":
+                self.question = True
+            if form in unsuitable_marks:
+                self.marks = True
+            if n.ord < self.first.ord: # words are compared by their order in the sentence
+                self.first = n
+
+
+def has_unsuitable_word(counts):
+    # lemmas, their compound parts and word forms
+    return unsuitable_words.find(counts.lemmas, counts.forms) is not None
+
+
+# checks in the order their reasons are reported: (name, short_msg, long_msg, the sentence fails if True)
+root_checks = [
+    ('short', 'Not', 'too short', lambda c: c.descendants < 2),
+    ('punct', 'Not', 'no puncuation marks', lambda c: c.punct == 0),
+    ('parataxis', 'Not', 'indirect or direct speech', lambda c: c.parataxis > 0),
+    ('orphan', 'Not', 'elliptical sentence', lambda c: c.orphan > 0),
+    ('verb', 'Not', 'without verb', lambda c: c.upos != "VERB" and not c.aux_child),
+    ('word', 'Not', 'includes an unsuitable word', has_unsuitable_word),
+    ('final', 'Not', 'not a correct punctuation mark', lambda c: not c.question and not c.dot and not c.exclamation),
+    ('capital', 'Not', 'no capital letter at the beginning of the sentence', lambda c: not capital_letter.search(c.first.form)),
+    ('conj', 'Not', 'sentence starts with a conjunction', lambda c: c.first.xpos == "J"),
+    ('marks', 'Not', 'sentence includes unsuitable marks', lambda c: c.marks),
+    # NotTrv - not trivial
+    ('verbs', 'NotTrv', 'too many verbs', lambda c: c.verbs > 1),
+    ('auxes', 'NotTrv', 'too many auxiliaries', lambda c: c.auxes > 1),
+    # eg aux and verb together if there is a conjunction (cop sentences are still possible then)
+    # excludes eg "kingad on märjad ja jalad külmetavad" if simple clause is expected
+    ('aux_verb', 'NotTrv', 'can be unsuitable for simple clause (aux and verb together)', lambda c: c.v_xpos > 1 and c.conj),
+]
+check_names = [check[0] for check in root_checks]
+
+# how often each check gave the reported reason in EDT dev and test, the unsuitable word check is the most costly
+default_order = 'parataxis,verbs,aux_verb,auxes,conj,verb,capital,marks,short,punct,word,final,orphan'
+
 
 class MarkRootLevels(Block):
     """Block for determing syntactic complexity  in UD v2."""
-    def __init__(self, save_stats=True, tests=None, skip=None, **kwargs):
+    def __init__(self, save_stats=True, tests=None, skip=None, check_order=default_order, calibrate=0, **kwargs):
         """Create the MarkBugs block object.
 
         Args:
@@ -40,13 +130,24 @@ class MarkRootLevels(Block):
             You can use e.g. `skip=no-(VerbForm|NumType|PronType)`.
             This has higher priority than the `tests` regex.
             Default = None (or empty string) which means no skipping.
+        check_order: comma-separated names of the root checks in the order they are tried.
+            The reported reason does not depend on the order, it only changes the speed.
+        calibrate: number of sentences on which every check is timed and counted,
+            after them the checks are reordered by cost / rejection rate. Default = 0 (no calibration).
         """
         super().__init__(**kwargs)
         self.save_stats = save_stats
         self.stats = collections.Counter()
         self.tests_re = re.compile(tests) if (tests is not None and tests != '') else None
         self.skip_re = re.compile(skip) if (skip is not None and skip != '') else None
-        
+        names = [name for name in check_order.split(',') if name]
+        order = [check_names.index(name) for name in names if name in check_names]
+        self.order = order + [i for i in range(len(root_checks)) if i not in order]
+        self.calibrate = int(calibrate)
+        self.calibrated = 0
+        self.check_time = [0] * len(root_checks)
+        self.check_rejects = [0] * len(root_checks)
+
 
     def log(self, node, short_msg, long_msg):
         """Log node.address() + long_msg and add ToDo=short_msg to node.misc."""
@@ -61,79 +162,55 @@ class MarkRootLevels(Block):
         else:
             node.misc['Lvl'] = short_msg
         self.stats[short_msg] += 1
-            
-        
+
+    def first_failing(self, counts):
+        """Index of the first check in `root_checks` that the sentence fails (None if it passes all).
+
+        Checks are tried in `self.order`; after a check fails, only checks before it
+        in `root_checks` still matter, so the result is the same for every order.
+        """
+        failing = len(root_checks)
+        for i in self.order:
+            if i < failing and root_checks[i][3](counts):
+                failing = i
+                if i == 0:
+                    break
+        return failing if failing < len(root_checks) else None
+
+    def calibrate_checks(self, counts):
+        """Times every check on one sentence, reorders the checks after `self.calibrate` sentences."""
+        failing = None
+        for i, check in enumerate(root_checks):
+            started = time.perf_counter()
+            failed = check[3](counts)
+            self.check_time[i] += time.perf_counter() - started
+            if failed and failing is None:
+                failing = i
+        if failing is not None:
+            self.check_rejects[failing] += 1
+        self.calibrated += 1
+        if self.calibrated == self.calibrate:
+            rank = lambda i: self.check_time[i] / (self.check_rejects[i] + 1) # cheap and often rejecting checks first
+            self.order = sorted(range(len(root_checks)), key=rank)
+            logging.warning('ud.MarkRootLevels calibrated on %d sentences: check_order=%s', self.calibrated,
+                            ','.join(check_names[i] for i in self.order))
+        return failing
+
+
     # pylint: disable=too-many-branches, too-many-statements
     def process_node(self, node):
-        form, udeprel, upos, feats, deprel = node.form, node.udeprel, node.upos, node.feats, node.deprel
-        parent = node.parent
-        r = node
-        while r.deprel != "root":
-            r = r.parent
-
-        if r.misc['Lvl']!= "Not":
-            if deprel=="root" :
-                l =[n.deprel for n in node.descendants] 
-                # Not - unsuitable sentences
-                if len(node.descendants)<2:
-                    self.log(node,"Not","too short")
-                    return
-                if l.count("punct") == 0: 
-                    self.log(node,"Not","no puncuation marks")
-                    return
-                if l.count("parataxis") > 0 :
-                    self.log(node,'Not','indirect or direct speech')
-                    return
-                if l.count("orphan") > 0 :
-                    self.log(node,'Not','elliptical sentence')
-                    return
-                if  upos!= "VERB" and "AUX" not in [n.upos for n in node.children] : 
-                    self.log(node,'Not','without verb')
-                    return
-                for l in [n.lemma for n in node.root.descendants]:
-                    for i in unsuitable_words:
-                        l=l.lower()
-                        if "=" in l:
-                            l=l.replace("=","")
-                            if l == i:
-                                self.log(node,'Not','includes an unsuitable word')
-                                return
-                        elif "_" in l:
-                            l=l.replace("_","")
-                            if l == i:
-                                self.log(node,'Not','includes an unsuitable word')
-                                return
-                        else:
-                            if l == i:
-                                self.log(node,'Not','includes an unsuitable word')
-                                return
-                if [n.form for n in node.descendants].count("?") < 1 and [n.form for n in node.root.descendants].count(".") < 1 and [n.form for n in node.root.descendants].count("!") < 1: 
-                    self.log(node,'Not','not a correct punctuation mark')
-                    return
-                sorted_nodes = sorted([node] + node.descendants, key=lambda n: n.ord) # words are sorted by their order in the sentence
-                pattern="[A-ZÜÕÄÖ].*" # word starts with a capital letter
-                if not re.search(pattern, sorted_nodes[0].form):
-                    self.log(node,'Not','no capital letter at the beginning of the sentence')
-                    return
-                if sorted_nodes[0].xpos == "J": 
-                    self.log(node,'Not','sentence starts with a conjunction')
-                    return
-                unsuitable=["(",")","[","]","{","}",":",";","-","/","\\"] # some unsuitable marks
-                for m in unsuitable:
-                    if m in [n.form for n in node.descendants]:
-                        self.log(node,'Not','sentence includes unsuitable marks')
-                        return
-                # NotTrv - not trivial
-                if [n.upos for n in node.descendants].count("VERB") > 1: 
-                    self.log(node,'NotTrv','too many verbs')
-                    return
-                if [n.upos for n in node.descendants].count("AUX") > 1:
-                    self.log(node,'NotTrv','too many auxiliaries')
-                    return
-                if [n.xpos for n in node.root.descendants].count("V") > 1 and ([n.upos for n in node.root.descendants].count("CCONJ") > 0 or [n.upos for n in node.root.descendants].count("SCONJ") > 0): # eg aux and verb together if there is a conjunction (cop sentences are still possible then)
-                    self.log(node,'NotTrv','can be unsuitable for simple clause (aux and verb together)') # excludes eg "kingad on märjad ja jalad külmetavad" if simple clause is expected
-                    return
-                    
+        if node.deprel != "root" or node.misc['Lvl'] == "Not":
+            return
+        # Not - unsuitable sentences, NotTrv - not trivial
+        counts = RootCounts(node)
+        if self.calibrated < self.calibrate:
+            failing = self.calibrate_checks(counts)
+        else:
+            failing = self.first_failing(counts)
+        if failing is not None:
+            short_msg, long_msg = root_checks[failing][1:3]
+            self.log(node, short_msg, long_msg)
+
     def after_process_document(self, document):
         total = 0
         message = 'ud.MarkRootLevels Overview:'
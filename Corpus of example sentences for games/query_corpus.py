@@ -0,0 +1,334 @@
+"""
+Inverted index and tree-pattern queries over tagged conllu-files
+The index is built once and saved; a query intersects postings lists and
+checks the tree constraints only in the sentences that remain.
+
+Query language (terms are joined with & or spaces, ! negates a term):
+    obl[Case=Ade]           a word with deprel obl in adessive
+    *[upos=VERB,VerbForm=Sup]   any word with these values (* = any deprel)
+    Case=Ade                same as *[Case=Ade]
+    obl>case                a word with deprel obl has a dependent with deprel case
+    obl[Case=Ade]>*[upos=ADP]   the same with constraints on both words
+    len<=10                 sentence has at most 10 words (also <, >, >=, =)
+Keys inside [] are deprel, upos, xpos, lemma, form, Lvl or any feature.
+Word forms are not indexed, they are checked in the sentences found by the other terms.
+
+Example:
+    python query_corpus.py build edt.index et_edt-ud-dev.conllu et_edt-ud-test.conllu
+    python query_corpus.py query edt.index "obl[Case=Ade] & nsubj:cop & !advmod & len<=10"
+"""
+
+import argparse
+import os
+import pickle
+import re
+import sys
+import time
+from array import array
+from collections import defaultdict
+
+parser = argparse.ArgumentParser(description='Builds an index of conllu-files and finds sentences matching a tree pattern.')
+subparsers = parser.add_subparsers(dest='command')
+build_parser = subparsers.add_parser('build', help="build the index")
+build_parser.add_argument('index', type=str, help="filename of the index")
+build_parser.add_argument('paths', type=str, nargs='+', help="conllu-files or folders with conllu-files")
+query_parser = subparsers.add_parser('query', help="query the index")
+query_parser.add_argument('index', type=str, help="filename of the index")
+query_parser.add_argument('query', type=str, help="query, eg \"obl[Case=Ade] & nsubj:cop & !advmod & len<=10\"")
+query_parser.add_argument('--limit', dest='limit', type=int, default=0, help="print at most this many sentences")
+query_parser.add_argument('--conllu', dest='conllu', action='store_true', help="print whole sentences in conllu-format")
+
+TERM = re.compile(r"\s*(!?)\s*(len\s*(?:<=|>=|<|>|=)\s*\d+|[^\s&\[\]>]+(?:\[[^\]]*\])?(?:>[^\s&\[\]>]+(?:\[[^\]]*\])?)?)\s*&?")
+NODE = re.compile(r"^([^\[\]]+)(?:\[([^\]]*)\])?$")
+LENGTH = re.compile(r"len\s*(<=|>=|<|>|=)\s*(\d+)")
+COMPARE = {'<=': lambda a, b: a <= b, '>=': lambda a, b: a >= b, '<': lambda a, b: a < b,
+           '>': lambda a, b: a > b, '=': lambda a, b: a == b}
+
+
+def get_files(dir):
+    """
+    Returns all the files in a folder
+    Recursive version
+    :param dir:
+    :return: the list of file names
+    """
+    files = []
+    for file in sorted(os.listdir(dir)):
+        path = dir + '/' + file
+        if os.path.isdir(path):
+            files += get_files(path)
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def read_sentences(file):
+    """
+    Reads a conllu-file sentence by sentence
+    :param file:
+    :return: byte offset of the sentence and its lines
+    """
+    with open(file, "rb") as f:
+        lines = []
+        start = offset = 0
+        for raw in f:
+            line = raw.decode('utf8').rstrip('\r\n')
+            if line.strip():
+                if not lines:
+                    start = offset
+                lines.append(line)
+            elif lines:
+                yield start, lines
+                lines = []
+            offset += len(raw)
+        if lines:
+            yield start, lines
+
+
+def parse_word(columns):
+    """
+    Creates a dictionary of the values a query can ask about
+    :param columns: columns of a conllu-line
+    :return:
+    """
+    word = {'form': columns[1], 'lemma': columns[2], 'upos': columns[3], 'xpos': columns[4],
+            'deprel': columns[7]}
+    if columns[5] != '_':
+        for feat in columns[5].split('|'):
+            if '=' in feat:
+                key, value = feat.split('=', 1)
+                word[key] = value
+    misc = columns[9] if len(columns) > 9 else '_'
+    if 'Lvl=' in misc:
+        word['Lvl'] = re.sub("Lvl=([^|]*).*", r"\1", misc[misc.index('Lvl='):]).split(',')
+    return word
+
+
+class CorpusIndex:
+    """Postings lists of sentences and the words needed for checking tree constraints."""
+    def __init__(self):
+        self.postings = defaultdict(lambda: array('I')) # key -> sorted array of sentence numbers
+        self.sentences = [] # (file, offset, sent_id, text)
+        self.words = [] # word lines of every sentence as one string, parsed only when a sentence is checked
+
+    def add(self, file, offset, lines):
+        number = len(self.sentences)
+        sent_id, text = '', ''
+        words, heads, word_lines = [], [], []
+        for line in lines:
+            if line.startswith('# sent_id'):
+                sent_id = line.split('=', 1)[1].strip()
+            elif line.startswith('# text'):
+                text = line.split('=', 1)[1].strip()
+            elif line[0] != '#':
+                columns = line.split('\t')
+                if len(columns) < 8 or not columns[0].isdigit(): # multiword tokens and empty nodes
+                    continue
+                words.append(parse_word(columns))
+                heads.append(int(columns[6]) - 1 if columns[6].isdigit() else -1)
+                word_lines.append(line)
+        keys = set()
+        for word, head in zip(words, heads):
+            for key, value in word.items():
+                if key == 'form' or key == 'deprel': # forms are not indexed, deprel is the bare key below
+                    continue
+                for v in (value if isinstance(value, list) else [value]):
+                    keys.add(key + '=' + v)
+            keys.add(word['deprel'])
+            if head >= 0:
+                keys.add(words[head]['deprel'] + '>' + word['deprel'])
+        for key in keys:
+            self.postings[key].append(number)
+        self.sentences.append((file, offset, sent_id, text))
+        self.words.append('\n'.join(word_lines))
+
+    def tree(self, number):
+        """
+        Parses the words of a sentence
+        :param number: sentence number
+        :return: list of words (dictionaries) and list of head positions (-1 = root)
+        """
+        words, heads = [], []
+        for line in self.words[number].split('\n'):
+            columns = line.split('\t')
+            words.append(parse_word(columns))
+            heads.append(int(columns[6]) - 1 if columns[6].isdigit() else -1)
+        return words, heads
+
+    def build(self, files):
+        for file in files:
+            for offset, lines in read_sentences(file):
+                self.add(file, offset, lines)
+        self.postings = dict(self.postings)
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        index = cls()
+        with open(filename, 'rb') as f:
+            index.__dict__.update(pickle.load(f))
+        return index
+
+    def lines(self, number):
+        """Reads the sentence from its conllu-file."""
+        file, offset = self.sentences[number][:2]
+        lines = []
+        with open(file, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                line = raw.decode('utf8').rstrip('\r\n')
+                if not line.strip():
+                    break
+                lines.append(line)
+        return lines
+
+    def query(self, query):
+        """
+        Returns the numbers of the sentences that match the query
+        :param query: string in the query language (see the module docstring)
+        :return: sorted list of sentence numbers
+        """
+        terms = parse_query(query)
+        positive = [t for t in terms if not t.negated]
+        negative = [t for t in terms if t.negated]
+        candidates = None
+        for term in sorted(positive, key=lambda t: min(len(self.postings.get(k, ())) for k in t.keys) if t.keys else len(self.sentences)):
+            for key in term.keys:
+                postings = self.postings.get(key, ())
+                candidates = set(postings) if candidates is None else candidates.intersection(postings)
+        if candidates is None:
+            candidates = set(range(len(self.sentences)))
+        for term in negative:
+            if term.exact: # postings are the answer, no checking needed
+                candidates.difference_update(self.postings.get(term.keys[0], ()))
+        checked = [t for t in terms if not t.exact] # exact terms are answered by the postings
+        required = ['\t' + form + '\t' for term in positive for form in term.forms] # tested before parsing
+        result = []
+        for number in sorted(candidates):
+            if any(form not in self.words[number] for form in required):
+                continue
+            words, heads = self.tree(number) if checked else (None, None)
+            if all(term.match(words, heads) != term.negated for term in checked):
+                result.append(number)
+        return result
+
+
+class Term:
+    """One term of a query: a word pattern, a head-dependent pattern or a length condition."""
+    def __init__(self, text, negated):
+        self.text = text
+        self.negated = negated
+        self.length = None
+        self.head = None
+        self.child = None
+        self.forms = []
+        length = LENGTH.fullmatch(text)
+        if length:
+            self.length = COMPARE[length.group(1)], int(length.group(2))
+            self.keys = []
+            self.exact = False
+            return
+        if '>' in text and not text.startswith('len'):
+            head, child = text.split('>', 1)
+            self.head, self.child = parse_node(head), parse_node(child)
+        else:
+            self.head = parse_node(text)
+        self.keys = [k + '=' + v for k, v in self.head.items() if k != 'deprel' and k != 'form']
+        if 'deprel' in self.head:
+            self.keys.append(self.head['deprel'])
+        if self.child is not None:
+            self.keys += [k + '=' + v for k, v in self.child.items() if k != 'deprel' and k != 'form']
+            if 'deprel' in self.head and 'deprel' in self.child:
+                self.keys.append(self.head['deprel'] + '>' + self.child['deprel'])
+            elif 'deprel' in self.child:
+                self.keys.append(self.child['deprel'])
+        # a single postings key says everything about the term, forms are not indexed
+        self.forms = [node['form'] for node in (self.head, self.child) if node is not None and 'form' in node]
+        self.exact = not self.forms and len(self.keys) == 1 and (self.child is None or len(self.head) + len(self.child) == 2)
+
+    def match(self, words, heads):
+        if self.length is not None:
+            compare, value = self.length
+            return compare(len(words), value)
+        for i, word in enumerate(words):
+            if not matches(word, self.head):
+                continue
+            if self.child is None:
+                return True
+            for j, head in enumerate(heads):
+                if head == i and matches(words[j], self.child):
+                    return True
+        return False
+
+
+def parse_node(text):
+    node = NODE.match(text.strip())
+    if not node:
+        raise ValueError("cannot parse word pattern: " + text)
+    name, constraints = node.group(1).strip(), node.group(2)
+    pattern = {}
+    if '=' in name and constraints is None: # Case=Ade means *[Case=Ade]
+        constraints, name = name, '*'
+    if name != '*':
+        pattern['deprel'] = name
+    if constraints:
+        for constraint in constraints.split(','):
+            key, value = constraint.split('=', 1)
+            pattern[key.strip()] = value.strip()
+    return pattern
+
+
+def matches(word, pattern):
+    for key, value in pattern.items():
+        actual = word.get(key)
+        if isinstance(actual, list):
+            if value not in actual:
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def parse_query(query):
+    terms = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        term = TERM.match(query, position)
+        if not term or term.end() == position:
+            raise ValueError("cannot parse query at: " + query[position:])
+        terms.append(Term(term.group(2).strip(), term.group(1) == '!'))
+        position = term.end()
+    return terms
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        files = []
+        for path in args.paths:
+            files += get_files(path) if os.path.isdir(path) else [path]
+        start = time.time()
+        index = CorpusIndex()
+        index.build(files)
+        index.save(args.index)
+        print('%d sentences, %d keys, %.1f s' % (len(index.sentences), len(index.postings), time.time() - start), file=sys.stderr)
+    elif args.command == 'query':
+        start = time.time()
+        index = CorpusIndex.load(args.index)
+        loaded = time.time() - start
+        start = time.time()
+        result = index.query(args.query)
+        elapsed = time.time() - start
+        for number in result[:args.limit] if args.limit else result:
+            if args.conllu:
+                print('\n'.join(index.lines(number)) + '\n')
+            else:
+                print('%s\t%s' % index.sentences[number][2:])
+        print('%d sentences, %.3f s (index loaded in %.3f s)' % (len(result), elapsed, loaded), file=sys.stderr)
+    else:
+        parser.print_help()
@@ -0,0 +1,186 @@
+"""
+Builds fixed-size level files from the output of divide_corpus.py
+Sentences are read as a stream and sampled in every level by stratum (the
+most common deprel of the words with Lvl-tags and sentence length). A level
+keeps at most --size sentences and one more for every stratum, so memory
+depends on the sample size and not on the size of the level files.
+"""
+# python sample_levels.py folder_or_file [...] --size 500 --output folder_name
+# cat level_*.conllu | python sample_levels.py - --size 500 --output folder_name
+
+import argparse
+import os
+import random
+import re
+import sys
+from collections import Counter, defaultdict
+from heapq import heappop, heappush, heapreplace
+
+from corpus_io import open_corpus
+
+parser = argparse.ArgumentParser(description='Samples a fixed number of sentences for every level, stratified by deprel and sentence length.')
+parser.add_argument('paths', type=str, nargs='+',
+                     help="level files, folders with level files or - for standard input")
+parser.add_argument('--size', dest='size', type=int, default=500,
+                     help="number of sentences in every level")
+parser.add_argument('--length-bins', dest='bins', type=str, default='5,8,12',
+                     help="upper bounds of sentence length classes (number of words)")
+parser.add_argument('--seed', dest='seed', type=int, default=1,
+                     help="seed of the random generator, same seed gives the same sample")
+parser.add_argument('--output', dest='output', type=str, default='.',
+                     help="folder for the sampled level files")
+
+
+def get_files(dir):
+    """
+    Returns all the files in a folder
+    Recursive version
+    :param dir:
+    :return: the list of file names
+    """
+    files = []
+    for file in sorted(os.listdir(dir)):
+        path = dir + '/' + file
+        if os.path.isdir(path):
+            files += get_files(path)
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def read_stream(f):
+    """
+    Yields sentences of a conllu-stream as lists of lines
+    :param f:
+    :return:
+    """
+    lines = []
+    for line in f:
+        line = line.rstrip('\n')
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            yield lines
+            lines = []
+    if lines:
+        yield lines
+
+
+def strata(lines, bins):
+    """
+    Finds levels of the sentence and its stratum in every level
+    Stratum is the most common deprel of the words tagged with the level and the length class
+    :param lines:
+    :param bins:
+    :return: dictionary level -> stratum
+    """
+    tagged = defaultdict(Counter)
+    length = 0
+    for line in lines:
+        if line[0] == '#':
+            continue
+        columns = line.split('\t')
+        if not columns[0].isdigit():
+            continue
+        length += 1
+        if len(columns) < 10:
+            continue
+        levels = re.sub("Lvl=([^|]*).*", r"\1", columns[9]) if "Lvl=" in columns[9] else ""
+        for level in levels.split(","):
+            if level.isdigit():
+                tagged[level][columns[7]] += 1
+    length_class = len(bins)
+    for i, bound in enumerate(bins):
+        if length <= bound:
+            length_class = i
+            break
+    # ties are broken by the name of the deprel, so the stratum does not depend on the order of words
+    return dict((level, (min(deprels, key=lambda deprel: (-deprels[deprel], deprel)), length_class))
+                for level, deprels in tagged.items())
+
+
+class LevelSample:
+    """
+    Stratified sample of one level
+    Every sentence gets a random priority and a stratum keeps the sentences with the smallest
+    priorities. Strata are taken in turns (see balance), so a stratum never gives more than
+    `limit` sentences, the smallest number with which the strata seen so far fill the sample.
+    """
+    def __init__(self, size, rand):
+        self.size = size
+        self.rand = rand
+        self.limit = size # only decreases, strata seen later can only give more sentences
+        self.total = 0
+        self.seen = {} # stratum -> number of sentences
+        self.kept = {} # stratum -> heap of (-priority, number, sentence)
+
+    def add(self, stratum, item):
+        number = self.total # ties of priorities are broken by the order of the stream
+        self.total += 1
+        self.seen[stratum] = self.seen.get(stratum, 0) + 1
+        heap = self.kept.setdefault(stratum, [])
+        priority = self.rand.random()
+        if len(heap) < self.limit:
+            heappush(heap, (-priority, number, item))
+        elif priority < -heap[0][0]:
+            heapreplace(heap, (-priority, number, item))
+        while self.limit > 1 and sum(min(seen, self.limit - 1) for seen in self.seen.values()) >= self.size:
+            self.limit -= 1
+            for heap in self.kept.values():
+                if len(heap) > self.limit:
+                    heappop(heap) # sentence with the largest priority
+
+    def items(self, stratum):
+        """Sentences of a stratum, smallest priority first."""
+        return [item for _, _, item in sorted(self.kept[stratum], reverse=True)]
+
+
+def balance(sample):
+    """
+    Takes sentences evenly from the strata of one level
+    Strata with fewer sentences give all they have, the rest is shared by the others
+    :param sample: LevelSample
+    :return: list of sentences
+    """
+    size = sample.size
+    pools = [sample.items(stratum)[::-1] for stratum in sorted(sample.kept)]
+    chosen = []
+    while len(chosen) < size and any(pools):
+        for pool in pools:
+            if pool and len(chosen) < size:
+                chosen.append(pool.pop())
+    return chosen
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    bins = [int(b) for b in args.bins.split(',') if b]
+    rand = random.Random(args.seed)
+    samples = {} # level -> LevelSample
+    sources = []
+    for path in args.paths:
+        if path == '-':
+            sources.append(None)
+        elif os.path.isdir(path):
+            sources += get_files(path)
+        else:
+            sources.append(path)
+
+    for source in sources:
+        f = sys.stdin if source is None else open_corpus(source, 'r', encoding='utf8')
+        for lines in read_stream(f):
+            for level, stratum in strata(lines, bins).items():
+                if level not in samples:
+                    samples[level] = LevelSample(args.size, rand)
+                samples[level].add(stratum, lines)
+        if source is not None:
+            f.close()
+
+    os.makedirs(args.output, exist_ok=True)
+    for level in sorted(samples, key=int):
+        sample = balance(samples[level])
+        with open(os.path.join(args.output, "level_" + level + ".conllu"), 'w', encoding='utf8') as f_out:
+            for lines in sample:
+                f_out.write('\n'.join(lines) + '\n\n')
+        print('level %s: %d of %d sentences, %d strata' % (level, len(sample), samples[level].total, len(samples[level].seen)), file=sys.stderr)
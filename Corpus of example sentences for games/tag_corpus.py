@@ -0,0 +1,57 @@
+"""
+Adds level tags to a conllu-file with udapy (ud.MarkRootLevels and ud.MarkLevels)
+Input and output files can be compressed (.gz, .xz, .zst), the same as:
+cat INPUT_FILE | udapy -s ud.MarkRootLevels | udapy -s ud.MarkLevels > OUTPUT_FILE
+"""
+# python tag_corpus.py et_edt-ud-train.conllu.xz tagged/et_edt-ud-train.conllu.gz 2> log.txt
+
+import argparse
+import shutil
+import subprocess
+import sys
+import threading
+
+from corpus_io import open_corpus, CHUNK
+
+parser = argparse.ArgumentParser(description='Adds level tags to a (compressed) conllu-file.')
+parser.add_argument('input', type=str,
+                     help="conllu-file, - for standard input")
+parser.add_argument('output', type=str,
+                     help="tagged conllu-file, - for standard output")
+parser.add_argument('--udapy', dest='udapy', type=str, default='udapy',
+                     help="udapy command")
+
+
+def copy(source, target):
+    """
+    Copies text from one file to another in chunks and closes the target
+    :param source:
+    :param target:
+    :return:
+    """
+    try:
+        shutil.copyfileobj(source, target, CHUNK)
+    finally:
+        target.close()
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    source = sys.stdin if args.input == '-' else open_corpus(args.input, 'r', encoding='utf8')
+    target = sys.stdout if args.output == '-' else open_corpus(args.output, 'w', encoding='utf8')
+    roots = subprocess.Popen([args.udapy, '-s', 'ud.MarkRootLevels'], stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, encoding='utf8')
+    levels = subprocess.Popen([args.udapy, '-s', 'ud.MarkLevels'], stdin=roots.stdout,
+                              stdout=subprocess.PIPE, encoding='utf8')
+    roots.stdout.close() # only MarkLevels reads it
+    feeder = threading.Thread(target=copy, args=(source, roots.stdin), daemon=True)
+    feeder.start()
+    shutil.copyfileobj(levels.stdout, target, CHUNK)
+    feeder.join()
+    if source is not sys.stdin:
+        source.close()
+    if target is not sys.stdout:
+        target.close()
+    statuses = roots.wait(), levels.wait()
+    sys.exit(max(statuses))
@@ -0,0 +1,161 @@
+"""
+Keeps ud.MarkRootLevels and ud.MarkLevels loaded and tags conllu-documents on request
+Udapi, estnltk and the word lists are loaded once, so small documents are
+answered without starting Python again.
+
+Messages (requests and answers) are framed the same way on a Unix socket and on stdin/stdout:
+    request:  CONLLU <number of bytes>\\n<document>
+    answer:   OK <bytes of tagged document> <bytes of overview>\\n<tagged document><overview>
+              ERROR <number of bytes>\\n<message>
+"""
+# python tag_server.py serve --socket /tmp/marklevels.sock 2> log.txt &
+# python tag_server.py client --socket /tmp/marklevels.sock < in.conllu > marked.conllu 2> overview.txt
+# python tag_server.py serve --stdio   (the same messages on stdin and stdout)
+
+import argparse
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+parser = argparse.ArgumentParser(description='Tagging server that keeps MarkRootLevels and MarkLevels loaded.')
+parser.add_argument('mode', type=str, choices=['serve', 'client'],
+                     help="serve: start the server, client: send standard input to the server")
+parser.add_argument('--socket', dest='socket', type=str, default='/tmp/marklevels.sock',
+                     help="path of the Unix socket")
+parser.add_argument('--stdio', dest='stdio', action='store_true',
+                     help="serve requests from standard input instead of the socket")
+
+
+def read_message(f):
+    """
+    Reads one framed message
+    :param f: binary file
+    :return: (kind, list of byte strings) or None at the end of the stream
+    """
+    header = f.readline()
+    if not header:
+        return None
+    parts = header.decode('ascii').split()
+    if not parts:
+        raise ValueError("empty header")
+    sizes = [int(size) for size in parts[1:]]
+    bodies = []
+    for size in sizes:
+        body = f.read(size)
+        if len(body) != size:
+            raise ValueError("message ended too early")
+        bodies.append(body)
+    return parts[0], bodies
+
+
+def write_message(f, kind, *bodies):
+    f.write(('%s %s\n' % (kind, ' '.join(str(len(body)) for body in bodies))).encode('ascii'))
+    for body in bodies:
+        f.write(body)
+    f.flush()
+
+
+class Tagger:
+    """MarkRootLevels and MarkLevels blocks, created once and applied to every document."""
+    def __init__(self):
+        from udapi.core.document import Document
+        from udapi.block.ud.markrootlevels import MarkRootLevels
+        from udapi.block.ud.marklevels import MarkLevels
+        self.document_class = Document
+        self.blocks = [MarkRootLevels(), MarkLevels()]
+        self.lock = threading.Lock() # blocks keep statistics, one document at a time
+
+    def tag(self, text):
+        """
+        Tags one conllu-document
+        :param text: document as a string
+        :return: tagged document and the overview of both blocks
+        """
+        with self.lock:
+            document = self.document_class()
+            document.from_conllu_string(text)
+            overview = []
+            for block in self.blocks:
+                block.before_process_document(document)
+                block.process_document(document)
+                block.after_process_document(document)
+                overview.append(document.meta.get("bugs", ""))
+            return document.to_conllu_string(), '\n'.join(overview)
+
+
+def answer(tagger, request):
+    """
+    Creates the answer to one request
+    :param tagger:
+    :param request: (kind, bodies)
+    :return: (kind, bodies) of the answer
+    """
+    kind, bodies = request
+    try:
+        if kind != 'CONLLU' or len(bodies) != 1:
+            raise ValueError("unknown request " + kind)
+        tagged, overview = tagger.tag(bodies[0].decode('utf8'))
+        return 'OK', [tagged.encode('utf8'), overview.encode('utf8')]
+    except Exception as error: # the server keeps running, the client gets the message
+        return 'ERROR', [('%s: %s' % (type(error).__name__, error)).encode('utf8')]
+
+
+def serve_stream(tagger, f_in, f_out):
+    while True:
+        request = read_message(f_in)
+        if request is None:
+            return
+        kind, bodies = answer(tagger, request)
+        write_message(f_out, kind, *bodies)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        serve_stream(self.server.tagger, self.rfile, self.wfile)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def client(path, text):
+    """
+    Sends a document to the server
+    :param path: path of the Unix socket
+    :param text: conllu-document as a string
+    :return: tagged document and overview
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        f = connection.makefile('rwb')
+        write_message(f, 'CONLLU', text.encode('utf8'))
+        kind, bodies = read_message(f)
+    if kind != 'OK':
+        raise RuntimeError(bodies[0].decode('utf8'))
+    return bodies[0].decode('utf8'), bodies[1].decode('utf8')
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    if args.mode == 'client':
+        tagged, overview = client(args.socket, sys.stdin.read())
+        sys.stdout.write(tagged)
+        sys.stderr.write(overview)
+    elif args.stdio:
+        serve_stream(Tagger(), sys.stdin.buffer, sys.stdout.buffer)
+    else:
+        tagger = Tagger()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        with Server(args.socket, Handler) as server:
+            server.tagger = tagger
+            print('listening on %s' % args.socket, file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(args.socket)
@@ -0,0 +1,143 @@
+# selects candidate sentences from corpora on disk with the same constraints as the Sketch Engine query of wiki17_corpus.csv
+# python concordance_filter.py corpus.txt > candidates.csv
+# python concordance_filter.py et_edt-ud-dev.conllu --format conllu --output-format conllu > candidates.conllu
+
+import argparse
+import csv
+import re
+import sys
+from collections import Counter
+
+parser = argparse.ArgumentParser(description='Streams a corpus and keeps sentences that Sketch Engine query of wiki17 would find.')
+parser.add_argument('filenames', type=str, nargs='*', default=['-'],
+                     help="corpus files, - for standard input")
+parser.add_argument('--format', dest='format', type=str, default='text', choices=['text', 'conllu', 'csv'],
+                     help="text: one sentence per line, conllu: tagged sentences, csv: Sketch Engine concordance")
+parser.add_argument('--output-format', dest='output_format', type=str, default='csv', choices=['text', 'conllu', 'csv'],
+                     help="csv output can be given to sketchengine_syntax.py")
+parser.add_argument('--encoding', dest='encoding', type=str, default='utf8',
+                     help="encoding of the corpus files")
+parser.add_argument('--min-tokens', dest='min_tokens', type=int, default=4)
+parser.add_argument('--max-tokens', dest='max_tokens', type=int, default=29)
+parser.add_argument('--min-verbs', dest='min_verbs', type=int, default=1,
+                     help="checked only in tagged (conllu) input")
+parser.add_argument('--max-verbs', dest='max_verbs', type=int, default=2,
+                     help="checked only in tagged (conllu) input")
+
+# query: [tag!="J"] [... word="[A-ZÜÕÄÖŠŽ][a-züõäöšž]{2,8}"] ... [word="[\.\?\!]"] !containing [word="[\;\:\)\(\]\[\/\\\>\<\-\""]"] !containing [word="."]{3}
+TOKEN = re.compile(r"\w+(?:-\w+)*|[^\w\s]") # hyphenated words are one token as in the corpus
+CAPITAL = re.compile(r"[A-ZÜÕÄÖŠŽ]")
+FINAL = re.compile(r"[.?!]")
+UNSUITABLE = re.compile(r"[;:)(\][/\\><\-\"]") # whole token, eg "-" but not "e-post"
+
+
+class ConcordanceFilter:
+    """Constraints of the concordance query, compiled once and checked cheapest first."""
+    def __init__(self, min_tokens=4, max_tokens=29, min_verbs=1, max_verbs=2):
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.min_verbs = min_verbs
+        self.max_verbs = max_verbs
+        self.stats = Counter()
+
+    def check(self, text, forms=None, tags=None):
+        """
+        Returns the reason why the sentence is rejected or None if it is a candidate
+        :param text: sentence as a string
+        :param forms: list of tokens, text is tokenized if missing
+        :param tags: list of part-of-speech tags (EDT xpos), tag checks are skipped if missing
+        :return:
+        """
+        if forms is None:
+            forms = TOKEN.findall(text)
+        if not self.min_tokens <= len(forms) <= self.max_tokens:
+            return 'length'
+        if not CAPITAL.match(forms[0]):
+            return 'no capital letter'
+        if not FINAL.fullmatch(forms[-1]):
+            return 'not a correct punctuation mark'
+        short = 0 # consecutive one-character tokens, "." is a regular expression in [word="."]{3}
+        for form in forms:
+            if UNSUITABLE.fullmatch(form):
+                return 'unsuitable marks'
+            short = short + 1 if len(form) == 1 else 0
+            if short == 3:
+                return 'three one-character tokens'
+        if tags is not None:
+            if tags[0] == 'J':
+                return 'starts with a conjunction'
+            verbs = tags.count('V')
+            if not self.min_verbs <= verbs <= self.max_verbs:
+                return 'number of verbs'
+        return None
+
+    def __call__(self, text, forms=None, tags=None):
+        reason = self.check(text, forms, tags)
+        self.stats[reason or 'accepted'] += 1
+        return reason is None
+
+
+def read_text(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield line, line, None, None
+
+
+def read_csv(f):
+    for row in csv.reader(f):
+        if len(row) > 2 and row[1] == '<s>':
+            yield row, row[2], row[2].split(), None
+
+
+def read_conllu(f):
+    lines, forms, tags, text = [], [], [], None
+    for line in f:
+        line = line.rstrip('\n')
+        if line.strip():
+            lines.append(line)
+            if line.startswith('# text'):
+                text = line.split('=', 1)[1].strip()
+            elif line[0] != '#':
+                columns = line.split('\t')
+                if columns[0].isdigit():
+                    forms.append(columns[1])
+                    tags.append(columns[4])
+        elif lines:
+            yield lines, text or ' '.join(forms), forms, tags
+            lines, forms, tags, text = [], [], [], None
+    if lines:
+        yield lines, text or ' '.join(forms), forms, tags
+
+
+READERS = {'text': read_text, 'csv': read_csv, 'conllu': read_conllu}
+
+
+if __name__ == '__main__':
+
+    args = parser.parse_args()
+    if args.output_format == 'conllu' and args.format != 'conllu':
+        parser.error('conllu output needs conllu input')
+    accept = ConcordanceFilter(args.min_tokens, args.max_tokens, args.min_verbs, args.max_verbs)
+    out = sys.stdout
+    writer = csv.writer(out)
+    if args.output_format == 'csv': # same header as a Sketch Engine download, sketchengine_syntax.py skips 4 lines
+        writer.writerow(['corpus', ','.join(args.filenames)])
+        writer.writerow(['subcorpus', '-'])
+        writer.writerow(['concordance size', '-'])
+        writer.writerow(['query', 'concordance_filter.py'])
+    for filename in args.filenames:
+        f = sys.stdin if filename == '-' else open(filename, 'r', encoding=args.encoding, newline='' if args.format == 'csv' else None)
+        for original, text, forms, tags in READERS[args.format](f):
+            if not accept(text, forms, tags):
+                continue
+            if args.output_format == 'csv':
+                writer.writerow([filename, '<s>', ' '.join(forms) if forms else text, '</s>'])
+            elif args.output_format == 'conllu':
+                out.write('\n'.join(original) + '\n\n')
+            else:
+                out.write(text + '\n')
+        if filename != '-':
+            f.close()
+    for reason, count in sorted(accept.stats.items(), key=lambda pair: (pair[1], pair[0])):
+        print('%35s %10d' % (reason, count), file=sys.stderr)
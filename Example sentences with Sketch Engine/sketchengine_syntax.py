@@ -1,12 +1,31 @@
 # cleans corpus created from sentences from subcorpus wiki17 (Sketch Engine)
+# stages (read -> analyse -> parse -> write) run concurrently, parsing in a pool of worker threads
 
 import argparse
 import codecs
 import csv
-from estnltk import Text
-import re
+import hashlib
+import heapq
+import importlib.metadata
+import importlib.util
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
 import pandas as pd
 
+# the matcher of unsuitable words is the one of ud.MarkRootLevels and ud.MarkLevels,
+# loaded from its file so that the working directory does not matter
+BLACKLIST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Corpus of example sentences for games', 'blacklist.py')
+spec = importlib.util.spec_from_file_location('blacklist', BLACKLIST_FILE)
+blacklist = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(blacklist)
+Blacklist = blacklist.Blacklist
+
 parser = argparse.ArgumentParser(description='Cleans the corpus, outputs syntactically analysed sentences.')
 parser.add_argument('filename', type=str,
                      help="filename of your corpus")
@@ -14,45 +33,211 @@ parser.add_argument('--input-encoding',dest='input',type=str,default='utf8',
                      help="current encoding")
 parser.add_argument('--output-encoding',dest='output',type=str,default='utf8',help='new encoding')
 parser.add_argument('--unsuitable-words',dest='inappropriatewords',type=str,default='inappropriate_words.txt',help='list of unsuitable words')
+parser.add_argument('--cache',dest='cache',type=str,default='parse_cache.sqlite',help='file of cached syntactic analyses, empty string turns caching off')
+parser.add_argument('--workers',dest='workers',type=int,default=os.cpu_count() or 1,help='number of parser threads')
+parser.add_argument('--queue-size',dest='queue_size',type=int,default=64,help='maximum number of sentences waiting between two stages')
 
 args = parser.parse_args()
 
-sentences = []
+unsuitable_words = Blacklist.from_file(args.inappropriatewords) # unsuitable words are added to the automaton
+
+ANALYSIS_FORMAT = 'analysis-3' # part of the cache key, changes when the fields of an analysis change (2: roots added, 3: no forms of names)
+
+
+class ParseCache:
+    """Analyses of sentences stored on disk, key is the hash of normalized sentence, parser version and analysis format."""
+    def __init__(self, filename, parser_version):
+        self.parser_version = parser_version
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() # the connection is shared by the analyse and write stages
+        self.db = sqlite3.connect(filename, check_same_thread=False) if filename else None
+        if self.db is not None:
+            self.db.execute('CREATE TABLE IF NOT EXISTS parses (key TEXT PRIMARY KEY, analysis TEXT)')
+
+    def key(self, sentence):
+        normalized = ' '.join(unicodedata.normalize('NFC', sentence).split())
+        return hashlib.sha256((self.parser_version + '\n' + ANALYSIS_FORMAT + '\n' + normalized).encode('utf8')).hexdigest()
+
+    def get(self, sentence):
+        row = None
+        if self.db is not None:
+            with self.lock:
+                row = self.db.execute('SELECT analysis FROM parses WHERE key = ?', (self.key(sentence),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, sentence, analysis):
+        if self.db is not None:
+            with self.lock:
+                self.db.execute('INSERT OR REPLACE INTO parses VALUES (?, ?)', (self.key(sentence), json.dumps(analysis, ensure_ascii=False)))
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+
+
+class Stage:
+    """Counts items and busy time of a pipeline stage and samples the depth of its input queue."""
+    def __init__(self, name, inbox=None):
+        self.name = name
+        self.inbox = inbox
+        self.items = 0
+        self.busy = 0.0
+        self.depth_sum = 0
+        self.depth_max = 0
+        self.lock = threading.Lock()
+
+    def record(self, started):
+        with self.lock:
+            self.items += 1
+            self.busy += time.perf_counter() - started
+            if self.inbox is not None:
+                depth = self.inbox.qsize()
+                self.depth_sum += depth
+                self.depth_max = max(self.depth_max, depth)
+
+    def report(self, workers=1):
+        rate = self.items / self.busy * workers if self.busy else 0.0
+        depth = self.depth_sum / self.items if self.items else 0.0
+        return '%10s %10d %10.2f %12.1f %10.1f %10d' % (self.name, self.items, self.busy, rate, depth, self.depth_max)
+
+
+DONE = object() # end of the stream
 
-if args.input:
-    with open(args.filename, 'r', encoding=args.input) as csv_file:
+
+def read_stage(window, outbox, stage):
+    with open(args.filename, 'r', encoding=args.input, newline='') as csv_file:
         reader = csv.reader(csv_file)
-        for row in reader:
-            sentences.append(row)
-        
-unsuitable_words = []
-with open(args.inappropriatewords,"r",encoding="utf8") as f:
-    words = f.read()
-    words = re.sub(r"\s+", "\n", words).split("\n")
-    for word in words: # unsuitable words are added to list
-        if not word.isdigit():
-            unsuitable_words.append(word)
-    
-clean_sentences = [] # parts not needed are taken out
-for sentence in sentences[4:]:
-    clean_sentences.append(sentence[2])
-
-analysed_sentences = []
-for sentence in clean_sentences: 
-    sentence_lemmas=[]
-    text = Text(sentence)
-    maltparser = text.tag_syntax() # syntactic analysis
-    for info in maltparser['words']:
-        sentence_lemmas.append(info['text'].lower())
-        for i in info['analysis']:
-            sentence_lemmas.append(i['lemma'])
-    if not any(unsuitable in sentence_lemmas for unsuitable in unsuitable_words): # if sentence is suitable, syntactic analysis is added
-        malt_info = list(zip(maltparser.word_texts, maltparser['conll_syntax']))
-        for item in malt_info:
-            info= item[0],item[1]['parser_out'][0][0]
-            analysed_sentences.append(info)
-        analysed_sentences.append("\n")   
-
-with open('wiki17_corpus_malt.csv','w', encoding=args.output,newline='') as csv_file:
-    writer = csv.writer(csv_file)
-    writer.writerows(analysed_sentences)
\ No newline at end of file
+        number = 0
+        while True:
+            window.acquire() # backpressure: at most a fixed number of sentences are in the pipeline
+            started = time.perf_counter()
+            row = next(reader, None)
+            if row is None:
+                break
+            number += 1
+            if number > 4: # parts not needed are taken out
+                stage.record(started)
+                outbox.put((number, row[2]))
+            else:
+                window.release()
+    outbox.put(DONE)
+
+
+def analyse_stage(inbox, parse_box, write_box, stage):
+    Text = None
+    while True:
+        item = inbox.get()
+        if item is DONE:
+            break
+        started = time.perf_counter()
+        number, sentence = item
+        analysis = cache.get(sentence)
+        if analysis is not None:
+            stage.record(started)
+            write_box.put((number, sentence, analysis, True))
+        else:
+            if Text is None:
+                from estnltk import Text # imported only when something is not in the cache
+            text = Text(sentence)
+            text.tag_analysis() # morphological analysis
+            stage.record(started) # time waiting for the next stage is not counted
+            parse_box.put((number, sentence, text))
+    for _ in range(args.workers):
+        parse_box.put(DONE)
+
+
+def parse_stage(inbox, outbox, stage):
+    while True:
+        item = inbox.get()
+        if item is DONE:
+            break
+        started = time.perf_counter()
+        number, sentence, text = item
+        sentence_lemmas=[]
+        sentence_roots=[] # roots with compound marks (eg tule_kahju)
+        maltparser = text.tag_syntax() # syntactic analysis
+        for info in maltparser['words']:
+            if not info['analysis'] or any(i['partofspeech'] != 'H' for i in info['analysis']): # names are compared by lemma only
+                sentence_lemmas.append(info['text'].lower())
+            for i in info['analysis']:
+                sentence_lemmas.append(i['lemma'])
+                sentence_roots.append(i['root'])
+        analysis = {'words': maltparser.word_texts, 'lemmas': sentence_lemmas, 'roots': sentence_roots, 'conll_syntax': maltparser['conll_syntax']}
+        stage.record(started)
+        outbox.put((number, sentence, analysis, False))
+    outbox.put(DONE)
+
+
+def write_stage(window, inbox, stage, producers):
+    pending = [] # results that came before earlier sentences, heap by number
+    expected = 5 # number of the first sentence after the header
+    with open('wiki17_corpus_malt.csv','w', encoding=args.output,newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        while producers:
+            item = inbox.get()
+            if item is DONE:
+                producers -= 1
+                continue
+            started = time.perf_counter()
+            heapq.heappush(pending, item)
+            while pending and pending[0][0] == expected:
+                number, sentence, analysis, cached = heapq.heappop(pending)
+                if not cached:
+                    cache.put(sentence, analysis)
+                sentence_lemmas = analysis['lemmas'] + analysis['roots']
+                if unsuitable_words.find(sentence_lemmas) is None: # if sentence is suitable, syntactic analysis is added (forms are in lemmas)
+                    malt_info = list(zip(analysis['words'], analysis['conll_syntax']))
+                    for word in malt_info:
+                        info= word[0],word[1]['parser_out'][0][0]
+                        writer.writerow(info)
+                    writer.writerow("\n")
+                expected += 1
+                window.release()
+            stage.record(started)
+
+
+def run_stage(target, *stage_args):
+    try:
+        target(*stage_args)
+    except Exception as error: # the main thread reports the error and stops
+        errors.append(error)
+
+
+try:
+    parser_version = 'estnltk-' + importlib.metadata.version('estnltk') + '/maltparser'
+except importlib.metadata.PackageNotFoundError:
+    parser_version = 'estnltk/maltparser'
+cache = ParseCache(args.cache, parser_version)
+
+errors = []
+window = threading.Semaphore(args.queue_size * 4) # sentences read but not yet written
+read_box = queue.Queue(args.queue_size)
+parse_box = queue.Queue(args.queue_size)
+write_box = queue.Queue(args.queue_size)
+stages = [Stage('read'), Stage('analyse', read_box), Stage('parse', parse_box), Stage('write', write_box)]
+threads = [threading.Thread(target=run_stage, args=(read_stage, window, read_box, stages[0]), daemon=True),
+           threading.Thread(target=run_stage, args=(analyse_stage, read_box, parse_box, write_box, stages[1]), daemon=True)]
+threads += [threading.Thread(target=run_stage, args=(parse_stage, parse_box, write_box, stages[2]), daemon=True) for _ in range(args.workers)]
+writer_thread = threading.Thread(target=run_stage, args=(write_stage, window, write_box, stages[3], args.workers), daemon=True)
+started = time.perf_counter()
+for thread in threads + [writer_thread]:
+    thread.start()
+while writer_thread.is_alive() and not errors:
+    writer_thread.join(0.5)
+cache.close()
+if errors:
+    raise errors[0]
+
+elapsed = time.perf_counter() - started
+total = cache.hits + cache.misses
+print('parse cache: %d hits, %d misses (%.1f%% hit rate)' % (cache.hits, cache.misses, 100.0 * cache.hits / total if total else 0.0), file=sys.stderr)
+print('%10s %10s %10s %12s %10s %10s' % ('stage', 'sentences', 'busy s', 'sentences/s', 'avg queue', 'max queue'), file=sys.stderr)
+for stage in stages:
+    print(stage.report(args.workers if stage.name == 'parse' else 1), file=sys.stderr)
+print('%10s %10d %10.2f' % ('total', stages[3].items, elapsed), file=sys.stderr)